@@ -0,0 +1,1792 @@
+let boardData = { polygon: [], description: '', orientation: 0 };
+let trackLibrary = [];
+let libraryByCode = {};
+let placements = [];
+const placementById = new Map();
+let guideCircles = [];
+let nextId = 0;
+let selectedId = null;
+let selectedCircleId = null;
+let boardOrientation = 0;
+let zoom = 1;
+let pan = { x: 0, y: 0 };
+const colorPalette = ['#ff7f0e', '#9467bd', '#2ca02c', '#d62728', '#17becf', '#1f77b4'];
+const queryParams = new URLSearchParams(window.location.search);
+const componentId = queryParams.get('componentId');
+
+const padding = 60;
+const EXPANDED_SECTIONS_STORAGE_KEY = 'layoutDesignerExpandedSections';
+const GUIDE_CIRCLE_HANDLE_MIN_RADIUS_MM = 8;
+const GUIDE_CIRCLE_HANDLE_MAX_RADIUS_MM = 24;
+const GUIDE_CIRCLE_HANDLE_RADIUS_RATIO = 0.35;
+
+function loadExpandedSections() {
+    const globalStore = window.__layoutDesignerExpandedSections;
+    if (globalStore instanceof Set) {
+        return globalStore;
+    }
+    let fromStorage = null;
+    try {
+        const stored = window.localStorage && window.localStorage.getItem(EXPANDED_SECTIONS_STORAGE_KEY);
+        if (stored) {
+            const parsed = JSON.parse(stored);
+            if (Array.isArray(parsed)) {
+                fromStorage = new Set(parsed.map(value => String(value)));
+            }
+        }
+    } catch (error) {
+        fromStorage = null;
+    }
+    const initial = fromStorage instanceof Set ? fromStorage : new Set();
+    window.__layoutDesignerExpandedSections = initial;
+    return initial;
+}
+
+const expandedLibrarySections = loadExpandedSections();
+
+function persistExpandedSections() {
+    try {
+        if (window.localStorage) {
+            const payload = JSON.stringify(Array.from(expandedLibrarySections));
+            window.localStorage.setItem(EXPANDED_SECTIONS_STORAGE_KEY, payload);
+        }
+    } catch (error) {
+        // Ignore persistence errors (e.g., private mode restrictions)
+    }
+}
+
+function clonePoint(point) {
+    if (Array.isArray(point) && point.length >= 2) {
+        const x = Number(point[0]);
+        const y = Number(point[1]);
+        return [Number.isFinite(x) ? x : 0, Number.isFinite(y) ? y : 0];
+    }
+    if (point && typeof point === 'object') {
+        const x = Number(point.x);
+        const y = Number(point.y);
+        return [Number.isFinite(x) ? x : 0, Number.isFinite(y) ? y : 0];
+    }
+    return [0, 0];
+}
+
+function defaultPolygon() {
+    return [[0, 0], [2400, 0], [2400, 1200], [0, 1200]];
+}
+
+let polygon = (boardData.polygon && boardData.polygon.length ? boardData.polygon : defaultPolygon()).map(clonePoint);
+let minX = 0;
+let maxX = 0;
+let minY = 0;
+let maxY = 0;
+let widthMm = 1;
+let heightMm = 1;
+let boardCenter = { x: 0, y: 0 };
+let boardGeometryVersion = 0;
+
+const CATEGORY_SPECS = [
+    { name: 'Straights & Flex', kinds: ['straight', 'flex'] },
+    { name: 'Curves', kinds: ['curve'] },
+    { name: 'Points & Turnouts', kinds: ['point'] },
+    { name: 'Special Pieces', kinds: null },
+];
+
+let renderedLibraryMarkup = null;
+const librarySectionsContainer = document.getElementById('librarySections');
+
+function renderLibrarySections() {
+    if (!librarySectionsContainer) { return; }
+    if (!Array.isArray(trackLibrary)) {
+        trackLibrary = [];
+    }
+    const categories = CATEGORY_SPECS.map(spec => ({ name: spec.name, items: [] }));
+    const byName = new Map(categories.map(cat => [cat.name, cat]));
+    const fallback = CATEGORY_SPECS.find(spec => !spec.kinds) || CATEGORY_SPECS[CATEGORY_SPECS.length - 1];
+    trackLibrary.forEach(item => {
+        if (!item || typeof item !== 'object') { return; }
+        const kind = item.kind;
+        let target = CATEGORY_SPECS.find(spec => Array.isArray(spec.kinds) && spec.kinds.includes(kind));
+        if (!target) {
+            target = fallback;
+        }
+        if (!target) { return; }
+        byName.get(target.name).items.push(item);
+    });
+    let markup = '';
+    const shouldDefaultOpenFirst = expandedLibrarySections.size === 0;
+    let firstOpen = true;
+    categories.forEach(spec => {
+        const entry = byName.get(spec.name);
+        if (!entry || !entry.items.length) { return; }
+        const cards = entry.items.map(item => {
+            const radius = typeof item.radius === 'number' ? item.radius : null;
+            const radiusFragment = radius ? ` · Radius ${radius.toFixed(0)} mm` : '';
+            const kindLabel = item.kind ? String(item.kind).charAt(0).toUpperCase() + String(item.kind).slice(1) : '';
+            const lengthValue = item.displayLength ?? item.length ?? 0;
+            return (
+                `<div class="library-item">` +
+                `<div class="library-heading"><strong>${item.code}</strong><span>${item.name || ''}</span></div>` +
+                `<small>${kindLabel} · ${Number(lengthValue).toFixed(0)} mm${radiusFragment}</small>` +
+                `<div class="library-actions">` +
+                `<button data-code="${item.code}" class="add-piece">Add to board</button>` +
+                `</div>` +
+                `</div>`
+            );
+        }).join('');
+        const isOpen = expandedLibrarySections.has(spec.name) || (shouldDefaultOpenFirst && firstOpen);
+        const openAttr = isOpen ? ' open' : '';
+        if (isOpen) {
+            expandedLibrarySections.add(spec.name);
+        }
+        firstOpen = false;
+        markup += `<details class="library-section" data-section="${spec.name}"${openAttr}>` +
+            `<summary><span class="label">${spec.name}</span><span class="count">${entry.items.length}</span></summary>` +
+            `<div class="library-grid">${cards}</div>` +
+            `</details>`;
+    });
+    const hasSections = Boolean(markup);
+    if (!hasSections) {
+        markup = '<p class="hint">Track library is unavailable.</p>';
+    }
+    if (markup === renderedLibraryMarkup) {
+        return;
+    }
+    renderedLibraryMarkup = markup;
+    librarySectionsContainer.innerHTML = markup;
+    if (!hasSections) {
+        return;
+    }
+    persistExpandedSections();
+    requestFrameHeight();
+    librarySectionsContainer.querySelectorAll('.library-section').forEach(section => {
+        section.addEventListener('toggle', () => {
+            const sectionName = section.getAttribute('data-section');
+            if (sectionName) {
+                if (section.open) {
+                    expandedLibrarySections.add(sectionName);
+                } else {
+                    expandedLibrarySections.delete(sectionName);
+                }
+                persistExpandedSections();
+            }
+            requestAnimationFrame(() => requestFrameHeight());
+        });
+    });
+    librarySectionsContainer.querySelectorAll('.add-piece').forEach(button => {
+        button.addEventListener('click', event => {
+            const code = event.currentTarget.getAttribute('data-code');
+            if (code) {
+                addPiece(code);
+            }
+        });
+    });
+}
+
+function recalculateBoardGeometry() {
+    if (!polygon.length) {
+        polygon = defaultPolygon();
+    }
+    // Points are sanitised with clonePoint wherever polygon data enters the
+    // page, so the extents can be gathered in one pass without copying.
+    minX = Number.POSITIVE_INFINITY;
+    maxX = Number.NEGATIVE_INFINITY;
+    minY = Number.POSITIVE_INFINITY;
+    maxY = Number.NEGATIVE_INFINITY;
+    for (let i = 0; i < polygon.length; i += 1) {
+        const x = polygon[i][0];
+        const y = polygon[i][1];
+        if (x < minX) { minX = x; }
+        if (x > maxX) { maxX = x; }
+        if (y < minY) { minY = y; }
+        if (y > maxY) { maxY = y; }
+    }
+    widthMm = Math.max(maxX - minX, 1);
+    heightMm = Math.max(maxY - minY, 1);
+    boardCenter = { x: (minX + maxX) / 2, y: (minY + maxY) / 2 };
+    boardData.polygon = polygon;
+    boardData.orientation = boardOrientation;
+    boardGeometryVersion += 1;
+}
+
+recalculateBoardGeometry();
+
+function postToStreamlit(type, payload = {}) {
+    if (window.Streamlit) {
+        if (type === 'streamlit:setComponentValue' && 'value' in payload) {
+            window.Streamlit.setComponentValue(payload.value);
+            return;
+        }
+        if (type === 'streamlit:setFrameHeight' && 'height' in payload) {
+            window.Streamlit.setFrameHeight(payload.height);
+            return;
+        }
+        if (type === 'streamlit:componentReady') {
+            window.Streamlit.setComponentReady();
+            if ('height' in payload) {
+                window.Streamlit.setFrameHeight(payload.height);
+            }
+            return;
+        }
+    }
+    const message = Object.assign({
+        isStreamlitMessage: true,
+        type,
+    }, payload);
+    if (type === 'streamlit:componentReady' && !('apiVersion' in message)) {
+        message.apiVersion = 1;
+    }
+    if (componentId) {
+        message.componentId = componentId;
+    }
+    window.parent.postMessage(message, '*');
+}
+let nextCircleColor = 0;
+let sectionMode = false;
+let dragSectionIds = [];
+let dragStartX = new Float64Array(0);
+let dragStartY = new Float64Array(0);
+let dragLeaderIndex = -1;
+
+function resetDragSection() {
+    dragSectionIds = [];
+    dragStartX = new Float64Array(0);
+    dragStartY = new Float64Array(0);
+    dragLeaderIndex = -1;
+}
+const MIN_ZOOM = 0.4;
+const MAX_ZOOM = 3;
+zoom = Math.min(Math.max(Number.isFinite(zoom) ? zoom : 1, MIN_ZOOM), MAX_ZOOM);
+pan = { x: 0, y: 0 };
+
+const canvas = document.getElementById('boardCanvas');
+const ctx = canvas.getContext('2d');
+const boardLayer = typeof OffscreenCanvas === 'function' ? new OffscreenCanvas(1, 1) : document.createElement('canvas');
+const boardLayerCtx = boardLayer.getContext('2d');
+let boardLayerKey = null;
+const zoomSlider = document.getElementById('zoomSlider');
+const zoomValueLabel = document.getElementById('zoomValue');
+const resetViewButton = document.getElementById('resetView');
+const orientationLabel = document.getElementById('boardOrientationLabel');
+const rotateBoardLeftButton = document.getElementById('boardRotateLeft');
+const rotateBoardRightButton = document.getElementById('boardRotateRight');
+const selectionLabel = document.getElementById('selectionLabel');
+const circleListContainer = document.getElementById('circleList');
+const pageBody = document.body;
+
+function buildGuideCircleList(source) {
+    nextCircleColor = 0;
+    return (Array.isArray(source) ? source : []).map((circle, idx) => {
+        if (!circle || typeof circle !== 'object') { return null; }
+        const radius = typeof circle.radius === 'number' ? circle.radius : 0;
+        if (!radius || radius <= 0) { return null; }
+        const x = typeof circle.x === 'number' ? circle.x : boardCenter.x;
+        const y = typeof circle.y === 'number' ? circle.y : boardCenter.y;
+        return {
+            id: circle.id || ('circle-' + idx),
+            radius,
+            x,
+            y,
+            color: typeof circle.color === 'string' && circle.color ? circle.color : colorPalette[nextCircleColor++ % colorPalette.length],
+            label: typeof circle.label === 'string' && circle.label ? circle.label : `Radius ${radius.toFixed(0)} mm`,
+        };
+    }).filter(Boolean);
+}
+
+guideCircles = buildGuideCircleList(guideCircles);
+selectedCircleId = guideCircles.length ? guideCircles[guideCircles.length - 1].id : null;
+let draggingCircleId = null;
+let circleDragOffset = { x: 0, y: 0 };
+// Allow snapping to consider every piece on the board. Previously this was limited to
+// a small radius which meant the "Snap to piece" action did nothing unless the pieces
+// were already close together. Lifting the radius ensures we always snap to the best
+// available connection when the user explicitly requests it.
+const SNAP_DISTANCE_MM = Number.POSITIVE_INFINITY;
+const CONNECTION_TOLERANCE_MM = 3;
+const CONNECTION_TOLERANCE_SQ = CONNECTION_TOLERANCE_MM * CONNECTION_TOLERANCE_MM;
+const SNAP_DISTANCE_SQ = SNAP_DISTANCE_MM * SNAP_DISTANCE_MM;
+const ANGLE_TOLERANCE_RAD = Math.PI / 36;
+
+function getGuideCircleHandleRadiusMm(circle) {
+    if (!circle || typeof circle.radius !== 'number') {
+        return GUIDE_CIRCLE_HANDLE_MIN_RADIUS_MM;
+    }
+    const scaledRadius = circle.radius * GUIDE_CIRCLE_HANDLE_RADIUS_RATIO;
+    const boundedRadius = Math.min(Math.max(scaledRadius, GUIDE_CIRCLE_HANDLE_MIN_RADIUS_MM), GUIDE_CIRCLE_HANDLE_MAX_RADIUS_MM);
+    return boundedRadius;
+}
+
+function updateBoardOrientationLabel() {
+    if (!orientationLabel) { return; }
+    const value = ((boardOrientation % 360) + 360) % 360;
+    orientationLabel.textContent = `${Math.round(value)}°`;
+}
+
+updateBoardOrientationLabel();
+
+const TWO_PI = Math.PI * 2;
+
+function toRadians(degrees) {
+    return (degrees || 0) * Math.PI / 180;
+}
+
+function toDegrees(radians) {
+    return radians * 180 / Math.PI;
+}
+
+function normalizeRadians(angle) {
+    if (!isFinite(angle)) { return 0; }
+    let value = angle % TWO_PI;
+    if (value <= -Math.PI) {
+        value += TWO_PI;
+    } else if (value > Math.PI) {
+        value -= TWO_PI;
+    }
+    return value;
+}
+
+function normalizeDegrees(angle) {
+    if (!isFinite(angle)) { return 0; }
+    let value = angle % 360;
+    if (value <= -180) {
+        value += 360;
+    }
+    if (value > 180) {
+        value -= 360;
+    }
+    return value;
+}
+
+const TRIG_CACHE_LIMIT = 256;
+const trigCache = new Map();
+
+function sinCos(angle) {
+    let entry = trigCache.get(angle);
+    if (!entry) {
+        if (trigCache.size >= TRIG_CACHE_LIMIT) {
+            trigCache.clear();
+        }
+        entry = { sin: Math.sin(angle), cos: Math.cos(angle) };
+        trigCache.set(angle, entry);
+    }
+    return entry;
+}
+
+function rotatePoint(x, y, angle) {
+    const { sin, cos } = sinCos(angle);
+    return {
+        x: x * cos - y * sin,
+        y: x * sin + y * cos,
+    };
+}
+
+function pieceFor(placement) {
+    return placement._piece || libraryByCode[placement.code];
+}
+
+function attachPieces() {
+    placements.forEach(placement => {
+        placement._piece = libraryByCode[placement.code];
+    });
+}
+
+function rebuildPlacementIndex() {
+    placementById.clear();
+    placements.forEach(placement => {
+        // Keep the first placement for duplicate ids, matching a linear search.
+        if (!placementById.has(placement.id)) {
+            placementById.set(placement.id, placement);
+        }
+    });
+}
+
+function getPlacementById(id) {
+    return placementById.get(id) || null;
+}
+
+function computeBaseScale() {
+    const availableWidth = Math.max(canvas.width - padding * 2, 1);
+    const availableHeight = Math.max(canvas.height - padding * 2, 1);
+    return Math.min(availableWidth / widthMm, availableHeight / heightMm);
+}
+
+function getScale() {
+    return computeBaseScale() * zoom;
+}
+
+function clampPan() {
+    const scale = getScale();
+    if (!Number.isFinite(scale) || scale <= 0 || !canvas.width || !canvas.height) {
+        pan.x = 0;
+        pan.y = 0;
+        return;
+    }
+    const boardWidth = Math.max(widthMm * scale, 0);
+    const boardHeight = Math.max(heightMm * scale, 0);
+    const marginX = Math.min(canvas.width * 0.35, 180);
+    const marginY = Math.min(canvas.height * 0.35, 180);
+    const minPanX = marginX - padding - boardWidth;
+    const maxPanX = canvas.width - marginX - padding;
+    if (minPanX <= maxPanX) {
+        pan.x = Math.min(Math.max(pan.x, minPanX), maxPanX);
+    } else {
+        pan.x = (minPanX + maxPanX) / 2;
+    }
+    const bottomBase = canvas.height - padding;
+    const topBase = bottomBase - boardHeight;
+    const minPanY = marginY - bottomBase;
+    const maxPanY = canvas.height - marginY - topBase;
+    if (minPanY <= maxPanY) {
+        pan.y = Math.min(Math.max(pan.y, minPanY), maxPanY);
+    } else {
+        pan.y = (minPanY + maxPanY) / 2;
+    }
+}
+
+function updateZoomUI() {
+    if (zoomSlider) {
+        zoomSlider.value = zoom.toFixed(2);
+    }
+    if (zoomValueLabel) {
+        zoomValueLabel.textContent = Math.round(zoom * 100) + '%';
+    }
+}
+
+function setZoom(targetZoom, focusPoint) {
+    const clamped = Math.min(Math.max(targetZoom, MIN_ZOOM), MAX_ZOOM);
+    if (!Number.isFinite(clamped) || Math.abs(clamped - zoom) < 1e-4) {
+        zoom = clamped;
+        updateZoomUI();
+        return;
+    }
+    const focus = focusPoint || { x: canvas.width / 2, y: canvas.height / 2 };
+    const mmBefore = canvasToMm(focus.x, focus.y);
+    zoom = clamped;
+    const after = mmToCanvas(mmBefore.x, mmBefore.y);
+    pan.x += focus.x - after.x;
+    pan.y += focus.y - after.y;
+    clampPan();
+    updateZoomUI();
+    scheduleDraw();
+    emitState();
+}
+
+function resetView() {
+    zoom = 1;
+    pan = { x: 0, y: 0 };
+    clampPan();
+    updateZoomUI();
+    draw();
+    emitState();
+}
+
+function resizeCanvas() {
+    const rect = canvas.getBoundingClientRect();
+    canvas.width = rect.width;
+    canvas.height = rect.height;
+    clampPan();
+    updateZoomUI();
+    draw();
+    requestFrameHeight();
+}
+
+function mmToCanvas(x, y) {
+    const scale = getScale();
+    const cx = (x - minX) * scale + padding + pan.x;
+    const cy = canvas.height - ((y - minY) * scale + padding) + pan.y;
+    return { x: cx, y: cy, scale };
+}
+
+function canvasToMm(x, y) {
+    const scale = getScale();
+    const mmX = (x - padding - pan.x) / scale + minX;
+    const mmY = ((canvas.height - (y - pan.y)) - padding) / scale + minY;
+    return { x: mmX, y: mmY, scale };
+}
+
+function drawBoard(target) {
+    if (!polygon.length) {
+        return;
+    }
+    target.save();
+    target.beginPath();
+    polygon.forEach((pt, idx) => {
+        const { x, y } = mmToCanvas(pt[0], pt[1]);
+        if (idx === 0) {
+            target.moveTo(x, y);
+        } else {
+            target.lineTo(x, y);
+        }
+    });
+    target.closePath();
+    target.fillStyle = '#f5f7ff';
+    target.fill();
+    target.lineWidth = 2;
+    target.strokeStyle = '#5a6aa1';
+    target.stroke();
+    target.restore();
+}
+
+function renderBoardLayer() {
+    const key = [canvas.width, canvas.height, zoom, pan.x, pan.y, boardGeometryVersion].join('|');
+    if (key === boardLayerKey) { return; }
+    boardLayerKey = key;
+    if (boardLayer.width !== canvas.width || boardLayer.height !== canvas.height) {
+        boardLayer.width = canvas.width;
+        boardLayer.height = canvas.height;
+    }
+    boardLayerCtx.clearRect(0, 0, boardLayer.width, boardLayer.height);
+    drawBoard(boardLayerCtx);
+}
+
+// Indexed by +selected: 0 for normal pieces, 1 for the selected piece.
+const PIECE_STYLES = [
+    { fill: '#dce9ff', stroke: '#1f77b4' },
+    { fill: '#ffe5d1', stroke: '#d62728' },
+];
+const CONNECTION_POINT_COLOR = '#2ca02c';
+
+// Each pair is indexed the same way as PIECE_STYLES.
+const straightGroups = [[], []];
+const curveGroups = [[], []];
+
+function isCurvePiece(piece) {
+    return piece.kind === 'curve' && piece.radius && piece.angle;
+}
+
+// Piece outlines only depend on the catalogue entry and the current scale,
+// so build each one once and reuse it until the zoom or library changes.
+const piecePaths = new Map();
+let piecePathScale = null;
+
+function clearPiecePaths() {
+    piecePaths.clear();
+    piecePathScale = null;
+}
+
+function piecePath(piece, scale) {
+    if (scale !== piecePathScale) {
+        piecePaths.clear();
+        piecePathScale = scale;
+    }
+    let path = piecePaths.get(piece.code);
+    if (!path) {
+        path = new Path2D();
+        if (isCurvePiece(piece)) {
+            const startAngle = piece.angle * Math.PI / 180 / 2;
+            path.arc(0, 0, piece.radius * scale, startAngle, -startAngle, true);
+        } else {
+            const trackWidth = Math.max(32 * scale, 4);
+            const displayLength = piece.displayLength || piece.length || 0;
+            const halfLength = (displayLength / 2) * scale;
+            path.rect(-halfLength, -trackWidth / 2, halfLength * 2, trackWidth);
+        }
+        piecePaths.set(piece.code, path);
+    }
+    return path;
+}
+
+function setPlacementTransform(placement) {
+    const { x, y } = mmToCanvas(placement.x, placement.y);
+    const { sin, cos } = sinCos((placement.rotation || 0) * Math.PI / 180);
+    // Equivalent to translate(x, y) followed by rotate(-rotation).
+    ctx.setTransform(cos, -sin, sin, cos, x, y);
+}
+
+function drawStraightGroup(group, style, scale) {
+    if (!group.length) { return; }
+    const trackWidth = Math.max(32 * scale, 4);
+    ctx.fillStyle = style.fill;
+    ctx.strokeStyle = style.stroke;
+    ctx.lineWidth = Math.max(2, trackWidth / 8);
+    group.forEach(placement => {
+        const path = piecePath(pieceFor(placement), scale);
+        setPlacementTransform(placement);
+        ctx.fill(path);
+        ctx.stroke(path);
+    });
+}
+
+function drawCurveGroup(group, style, scale) {
+    if (!group.length) { return; }
+    ctx.strokeStyle = style.stroke;
+    ctx.lineWidth = 6;
+    group.forEach(placement => {
+        setPlacementTransform(placement);
+        ctx.stroke(piecePath(pieceFor(placement), scale));
+    });
+}
+
+function visibleBoundsMm(marginPx) {
+    // Canvas y grows downwards while board y grows upwards, so the top-left
+    // corner maps to the maximum board y.
+    const scale = getScale();
+    if (!Number.isFinite(scale) || scale <= 0) { return null; }
+    const topLeft = canvasToMm(-marginPx, -marginPx);
+    const bottomRight = canvasToMm(canvas.width + marginPx, canvas.height + marginPx);
+    return {
+        minX: topLeft.x,
+        maxX: bottomRight.x,
+        minY: bottomRight.y,
+        maxY: topLeft.y,
+    };
+}
+
+function pieceBoundingRadiusMm(piece) {
+    if (isCurvePiece(piece)) {
+        return piece.radius;
+    }
+    const halfLength = (piece.displayLength || piece.length || 0) / 2;
+    // Straight pieces are drawn 32 mm wide with an outline of up to 4 mm.
+    return Math.hypot(halfLength, 18);
+}
+
+function isOutsideView(x, y, radius, view) {
+    return (
+        x + radius < view.minX ||
+        x - radius > view.maxX ||
+        y + radius < view.minY ||
+        y - radius > view.maxY
+    );
+}
+
+function drawPlacements() {
+    for (let style = 0; style < PIECE_STYLES.length; style += 1) {
+        straightGroups[style].length = 0;
+        curveGroups[style].length = 0;
+    }
+    // Pad the view by the widest stroke or connection dot so pieces whose
+    // outline just reaches the edge are still drawn.
+    const view = visibleBoundsMm(12);
+    placements.forEach(placement => {
+        const piece = pieceFor(placement);
+        if (!piece) { return; }
+        if (view && isOutsideView(placement.x, placement.y, pieceBoundingRadiusMm(piece), view)) {
+            return;
+        }
+        const groups = isCurvePiece(piece) ? curveGroups : straightGroups;
+        groups[+(placement.id === selectedId)].push(placement);
+    });
+
+    // Selected pieces are drawn last so they sit on top.
+    const scale = getScale();
+    for (let style = 0; style < PIECE_STYLES.length; style += 1) {
+        drawStraightGroup(straightGroups[style], PIECE_STYLES[style], scale);
+        drawCurveGroup(curveGroups[style], PIECE_STYLES[style], scale);
+    }
+    ctx.setTransform(1, 0, 0, 1, 0, 0);
+
+    ctx.fillStyle = CONNECTION_POINT_COLOR;
+    ctx.beginPath();
+    for (let style = 0; style < PIECE_STYLES.length; style += 1) {
+        addConnectionDots(straightGroups[style], scale);
+        addConnectionDots(curveGroups[style], scale);
+    }
+    ctx.fill();
+}
+
+function addConnectionDots(group, scale) {
+    // Same mapping as mmToCanvas.
+    const offsetX = padding + pan.x;
+    const offsetY = canvas.height - padding + pan.y;
+    for (let i = 0; i < group.length; i += 1) {
+        const endpoints = connectionPoints(group[i]);
+        for (let j = 0; j < endpoints.length; j += 1) {
+            const px = (endpoints[j].x - minX) * scale + offsetX;
+            const py = offsetY - (endpoints[j].y - minY) * scale;
+            ctx.moveTo(px + 6, py);
+            ctx.arc(px, py, 6, 0, 2 * Math.PI);
+        }
+    }
+}
+
+function drawGuideCircles() {
+    guideCircles.forEach(circle => {
+        const { x, y, scale } = mmToCanvas(circle.x, circle.y);
+        const radiusPx = circle.radius * scale;
+        const handleColor = circle.color || '#ff7f0e';
+        const handleRadiusMm = getGuideCircleHandleRadiusMm(circle);
+        const handleRadiusPx = Math.max(handleRadiusMm * scale, 6);
+        ctx.save();
+        ctx.beginPath();
+        ctx.setLineDash([10, 6]);
+        ctx.lineWidth = circle.id === selectedCircleId ? 3 : 2;
+        ctx.strokeStyle = handleColor;
+        ctx.arc(x, y, radiusPx, 0, Math.PI * 2);
+        ctx.stroke();
+        ctx.setLineDash([]);
+        ctx.globalAlpha = 0.16;
+        ctx.fillStyle = handleColor;
+        ctx.beginPath();
+        ctx.arc(x, y, handleRadiusPx, 0, Math.PI * 2);
+        ctx.fill();
+        ctx.globalAlpha = 1;
+        ctx.beginPath();
+        ctx.lineWidth = 1.5;
+        ctx.strokeStyle = handleColor;
+        ctx.arc(x, y, handleRadiusPx, 0, Math.PI * 2);
+        ctx.stroke();
+        ctx.beginPath();
+        ctx.fillStyle = '#ffffff';
+        ctx.arc(x, y, Math.max(handleRadiusPx * 0.45, 2), 0, Math.PI * 2);
+        ctx.fill();
+        ctx.beginPath();
+        ctx.fillStyle = handleColor;
+        ctx.arc(x, y, Math.max(handleRadiusPx * 0.2, 3), 0, Math.PI * 2);
+        ctx.fill();
+        ctx.restore();
+    });
+}
+
+function draw() {
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    renderBoardLayer();
+    if (boardLayer.width && boardLayer.height) {
+        ctx.drawImage(boardLayer, 0, 0);
+    }
+    drawPlacements();
+}
+
+let drawScheduled = false;
+
+function scheduleDraw() {
+    if (drawScheduled) { return; }
+    drawScheduled = true;
+    requestAnimationFrame(() => {
+        drawScheduled = false;
+        draw();
+    });
+}
+
+function scheduleCommit() {
+    scheduleDraw();
+    emitState();
+}
+
+const localEndpointCache = new WeakMap();
+
+function localEndpoints(piece, flipped) {
+    let entry = localEndpointCache.get(piece);
+    if (!entry) {
+        entry = {};
+        localEndpointCache.set(piece, entry);
+    }
+    const key = flipped ? 'flipped' : 'normal';
+    if (entry[key]) { return entry[key]; }
+
+    let endpoints;
+    if (piece.kind === 'curve' && piece.radius && piece.angle) {
+        const halfTheta = toRadians(piece.angle) / 2;
+        const orientation = flipped ? -1 : 1;
+        endpoints = [halfTheta, -halfTheta].map(baseAngle => {
+            const local = sinCos(baseAngle * orientation);
+            const localPosition = {
+                x: piece.radius * local.cos,
+                y: piece.radius * local.sin,
+            };
+            return {
+                localPosition,
+                localTangent: Math.atan2(local.cos * orientation, -local.sin * orientation),
+                localRadial: Math.atan2(localPosition.y, localPosition.x),
+            };
+        });
+    } else {
+        const displayLength = piece.displayLength || piece.length || 0;
+        const halfLength = displayLength / 2;
+        endpoints = [
+            { localPosition: { x: halfLength, y: 0 }, localTangent: 0 },
+            { localPosition: { x: -halfLength, y: 0 }, localTangent: Math.PI },
+        ];
+        endpoints.forEach(endpoint => {
+            endpoint.localRadial = Math.atan2(endpoint.localPosition.y, endpoint.localPosition.x);
+        });
+    }
+    entry[key] = endpoints;
+    return endpoints;
+}
+
+// World-space endpoints per placement object, reused until the placement's
+// position, rotation, flip or catalogue entry changes. Callers must treat the
+// returned array as read-only.
+const endpointCache = new WeakMap();
+
+function endpointGeometry(placement) {
+    const piece = pieceFor(placement);
+    if (!piece) { return []; }
+    const cached = endpointCache.get(placement);
+    if (
+        cached &&
+        cached.piece === piece &&
+        cached.x === placement.x &&
+        cached.y === placement.y &&
+        cached.rotation === placement.rotation &&
+        cached.flipped === placement.flipped
+    ) {
+        return cached.endpoints;
+    }
+    const endpoints = computeEndpointGeometry(placement, piece);
+    endpointCache.set(placement, {
+        piece,
+        x: placement.x,
+        y: placement.y,
+        rotation: placement.rotation,
+        flipped: placement.flipped,
+        endpoints,
+    });
+    return endpoints;
+}
+
+function computeEndpointGeometry(placement, piece) {
+    const rotation = toRadians(placement.rotation || 0);
+    const { sin, cos } = sinCos(rotation);
+    const locals = localEndpoints(piece, placement.flipped);
+    const result = new Array(locals.length);
+    for (let i = 0; i < locals.length; i += 1) {
+        const local = locals[i];
+        const lx = local.localPosition.x;
+        const ly = local.localPosition.y;
+        result[i] = {
+            x: placement.x + (lx * cos - ly * sin),
+            y: placement.y + (lx * sin + ly * cos),
+            tangent: normalizeRadians(local.localTangent + rotation),
+            radial: normalizeRadians(local.localRadial + rotation),
+            localPosition: local.localPosition,
+            localTangent: local.localTangent,
+            localRadial: local.localRadial,
+        };
+    }
+    return result;
+}
+
+function connectionPoints(placement) {
+    return endpointGeometry(placement);
+}
+
+function endpointsAreConnected(endpointA, endpointB) {
+    const dx = endpointA.x - endpointB.x;
+    const dy = endpointA.y - endpointB.y;
+    if (dx * dx + dy * dy > CONNECTION_TOLERANCE_SQ) {
+        return false;
+    }
+    const tangentDiff = Math.abs(normalizeRadians(endpointA.tangent - endpointB.tangent));
+    if (Math.abs(tangentDiff - Math.PI) < ANGLE_TOLERANCE_RAD) {
+        return true;
+    }
+    const radialA = endpointA.radial;
+    const radialB = endpointB.radial;
+    if (radialA === undefined || radialB === undefined) {
+        return false;
+    }
+    return Math.abs(normalizeRadians(radialA - radialB)) < ANGLE_TOLERANCE_RAD;
+}
+
+function endpointTable() {
+    const table = new Map();
+    placements.forEach(placement => {
+        if (!table.has(placement.id)) {
+            table.set(placement.id, endpointGeometry(placement));
+        }
+    });
+    return table;
+}
+
+function endpointGridKey(cellX, cellY) {
+    return cellX + ',' + cellY;
+}
+
+function buildEndpointGrid(endpointsById, cellSize) {
+    const grid = new Map();
+    endpointsById.forEach((endpoints, id) => {
+        endpoints.forEach(endpoint => {
+            const key = endpointGridKey(Math.floor(endpoint.x / cellSize), Math.floor(endpoint.y / cellSize));
+            let bucket = grid.get(key);
+            if (!bucket) {
+                bucket = [];
+                grid.set(key, bucket);
+            }
+            bucket.push({ id, endpoint });
+        });
+    });
+    return grid;
+}
+
+// Section membership only changes when placements are added, removed or
+// moved, so the connected components are computed once with union-find and
+// reused until invalidateSections() is called.
+let sectionRoots = null;
+
+function invalidateSections() {
+    sectionRoots = null;
+}
+
+function buildSectionRoots() {
+    const parent = new Map();
+    const find = id => {
+        let root = id;
+        while (parent.get(root) !== root) {
+            const next = parent.get(parent.get(root));
+            parent.set(root, next);
+            root = next;
+        }
+        return root;
+    };
+    // Bin every endpoint into cells the size of the connection tolerance, so
+    // only the 3x3 neighbourhood of each endpoint has to be checked.
+    const endpointsById = endpointTable();
+    const grid = buildEndpointGrid(endpointsById, CONNECTION_TOLERANCE_MM);
+    endpointsById.forEach((_, id) => parent.set(id, id));
+    endpointsById.forEach((endpoints, id) => {
+        endpoints.forEach(endpoint => {
+            const cellX = Math.floor(endpoint.x / CONNECTION_TOLERANCE_MM);
+            const cellY = Math.floor(endpoint.y / CONNECTION_TOLERANCE_MM);
+            for (let dx = -1; dx <= 1; dx += 1) {
+                for (let dy = -1; dy <= 1; dy += 1) {
+                    const bucket = grid.get(endpointGridKey(cellX + dx, cellY + dy));
+                    if (!bucket) { continue; }
+                    for (let k = 0; k < bucket.length; k += 1) {
+                        const entry = bucket[k];
+                        const rootA = find(id);
+                        const rootB = find(entry.id);
+                        if (rootA === rootB) { continue; }
+                        if (endpointsAreConnected(endpoint, entry.endpoint)) {
+                            parent.set(rootB, rootA);
+                        }
+                    }
+                }
+            }
+        });
+    });
+    const roots = new Map();
+    parent.forEach((_, id) => roots.set(id, find(id)));
+    return roots;
+}
+
+function connectedSectionIds(originId) {
+    if (!originId) { return []; }
+    if (!sectionRoots) {
+        sectionRoots = buildSectionRoots();
+    }
+    const root = sectionRoots.get(originId);
+    if (root === undefined) { return [originId]; }
+    const sectionIds = [originId];
+    sectionRoots.forEach((candidateRoot, id) => {
+        if (candidateRoot === root && id !== originId) {
+            sectionIds.push(id);
+        }
+    });
+    return sectionIds;
+}
+
+function applySectionTransform(sectionIds, pivotPoint, deltaRotationDeg, deltaX, deltaY) {
+    const { sin, cos } = sinCos(toRadians(deltaRotationDeg));
+    sectionIds.forEach(id => {
+        const piece = getPlacementById(id);
+        if (!piece) { return; }
+        if (deltaRotationDeg) {
+            const relX = piece.x - pivotPoint.x;
+            const relY = piece.y - pivotPoint.y;
+            const rotatedX = relX * cos - relY * sin;
+            const rotatedY = relX * sin + relY * cos;
+            piece.x = pivotPoint.x + rotatedX;
+            piece.y = pivotPoint.y + rotatedY;
+            piece.rotation = (piece.rotation + deltaRotationDeg + 360) % 360;
+        }
+        piece.x += deltaX;
+        piece.y += deltaY;
+    });
+    invalidateSections();
+}
+
+function findBestSnapTransform(placement) {
+    const endpoints = endpointGeometry(placement);
+    const transformedEndpoint = { x: 0, y: 0, tangent: 0, radial: 0 };
+    let best = null;
+    for (let p = 0; p < placements.length; p += 1) {
+        const other = placements[p];
+        if (other.id === placement.id) { continue; }
+        const otherEndpoints = endpointGeometry(other);
+        for (let e = 0; e < endpoints.length; e += 1) {
+            const endpoint = endpoints[e];
+            for (let t = 0; t < otherEndpoints.length; t += 1) {
+                const target = otherEndpoints[t];
+                const dx = endpoint.x - target.x;
+                const dy = endpoint.y - target.y;
+                const distanceSq = dx * dx + dy * dy;
+                if (distanceSq > SNAP_DISTANCE_SQ) { continue; }
+                const distance = Math.sqrt(distanceSq);
+                for (let c = 0; c < 2; c += 1) {
+                    const desiredTangent = c === 0
+                        ? normalizeRadians(target.tangent + Math.PI)
+                        : normalizeRadians(target.tangent);
+                    const deltaRotationRad = normalizeRadians(desiredTangent - endpoint.tangent);
+                    const deltaRotationDeg = normalizeDegrees(toDegrees(deltaRotationRad));
+                    const newRotationDeg = (placement.rotation + deltaRotationDeg + 360) % 360;
+                    const newRotationRad = toRadians(newRotationDeg);
+                    const { sin, cos } = sinCos(newRotationRad);
+                    const localX = endpoint.localPosition.x;
+                    const localY = endpoint.localPosition.y;
+                    const rotatedX = localX * cos - localY * sin;
+                    const rotatedY = localX * sin + localY * cos;
+                    transformedEndpoint.x = target.x;
+                    transformedEndpoint.y = target.y;
+                    transformedEndpoint.tangent = normalizeRadians(endpoint.localTangent + newRotationRad);
+                    transformedEndpoint.radial = normalizeRadians(Math.atan2(rotatedY, rotatedX));
+                    if (!endpointsAreConnected(transformedEndpoint, target)) { continue; }
+                    const rotationMagnitude = Math.abs(deltaRotationDeg);
+                    if (
+                        !best ||
+                        distance < best.distance - 1e-6 ||
+                        (Math.abs(distance - best.distance) < 1e-6 && rotationMagnitude < best.rotationMagnitude - 1e-6)
+                    ) {
+                        best = {
+                            distance,
+                            deltaRotationDeg,
+                            deltaX: (target.x - rotatedX) - placement.x,
+                            deltaY: (target.y - rotatedY) - placement.y,
+                            rotationMagnitude,
+                        };
+                    }
+                }
+            }
+        }
+    }
+    if (best) {
+        delete best.rotationMagnitude;
+    }
+    return best;
+}
+
+function rotateBoard(deltaDegrees) {
+    if (!Number.isFinite(deltaDegrees)) { return; }
+    const { sin, cos } = sinCos(toRadians(deltaDegrees));
+    const centreX = boardCenter.x;
+    const centreY = boardCenter.y;
+    for (let i = 0; i < polygon.length; i += 1) {
+        const point = polygon[i];
+        const relX = point[0] - centreX;
+        const relY = point[1] - centreY;
+        point[0] = centreX + (relX * cos - relY * sin);
+        point[1] = centreY + (relX * sin + relY * cos);
+    }
+    for (let i = 0; i < placements.length; i += 1) {
+        const piece = placements[i];
+        const relX = piece.x - centreX;
+        const relY = piece.y - centreY;
+        piece.x = centreX + (relX * cos - relY * sin);
+        piece.y = centreY + (relX * sin + relY * cos);
+        piece.rotation = (piece.rotation + deltaDegrees + 360) % 360;
+    }
+    for (let i = 0; i < guideCircles.length; i += 1) {
+        const circle = guideCircles[i];
+        const relX = circle.x - centreX;
+        const relY = circle.y - centreY;
+        circle.x = centreX + (relX * cos - relY * sin);
+        circle.y = centreY + (relX * sin + relY * cos);
+    }
+    boardOrientation = (boardOrientation + deltaDegrees) % 360;
+    invalidateSections();
+    recalculateBoardGeometry();
+    clampPan();
+    draw();
+    updateBoardOrientationLabel();
+    updateSelectionLabel();
+    renderCircleList();
+    emitState();
+}
+
+let emitScheduled = false;
+let lastEmittedJson = null;
+
+function buildStatePayload() {
+    return {
+        placements: placements.map(item => ({
+            id: item.id,
+            code: item.code,
+            x: item.x,
+            y: item.y,
+            rotation: item.rotation,
+            flipped: item.flipped,
+        })),
+        board: {
+            description: boardData.description,
+            // Serialised straight away, so the live polygon needs no copy.
+            polygon,
+            orientation: boardOrientation,
+        },
+        zoom,
+        pan: {
+            x: Number.isFinite(pan.x) ? pan.x : 0,
+            y: Number.isFinite(pan.y) ? pan.y : 0,
+        },
+    };
+}
+
+function flushStatePayload() {
+    const payload = buildStatePayload();
+    const jsonValue = JSON.stringify(payload);
+    if (jsonValue === lastEmittedJson) {
+        return payload;
+    }
+    lastEmittedJson = jsonValue;
+    postToStreamlit("streamlit:setComponentValue", {
+        value: jsonValue,
+    });
+    return payload;
+}
+
+function emitState(options = {}) {
+    const { immediate = false } = options;
+    if (immediate) {
+        return flushStatePayload();
+    }
+    if (!emitScheduled) {
+        emitScheduled = true;
+        requestAnimationFrame(() => {
+            emitScheduled = false;
+            flushStatePayload();
+        });
+    }
+    return null;
+}
+
+// Button edits often arrive in bursts; report them once the clicks pause.
+const EMIT_DEBOUNCE_MS = 50;
+let emitTimer = null;
+
+function scheduleEmit() {
+    clearTimeout(emitTimer);
+    emitTimer = setTimeout(() => {
+        emitTimer = null;
+        flushStatePayload();
+    }, EMIT_DEBOUNCE_MS);
+}
+
+function flushPendingEmit() {
+    if (emitTimer === null) { return; }
+    clearTimeout(emitTimer);
+    emitTimer = null;
+    flushStatePayload();
+}
+
+window.addEventListener('beforeunload', flushPendingEmit);
+
+function getCircleById(id) {
+    return guideCircles.find(circle => circle.id === id) || null;
+}
+
+function currentFrameHeight() {
+    const bodyHeight = pageBody ? pageBody.scrollHeight : 0;
+    const docHeight = document.documentElement ? document.documentElement.scrollHeight : 0;
+    return Math.max(bodyHeight, docHeight, window.innerHeight || 0);
+}
+
+function requestFrameHeight() {
+    postToStreamlit("streamlit:setFrameHeight", {
+        height: currentFrameHeight(),
+    });
+}
+
+function announceReady() {
+    postToStreamlit("streamlit:componentReady", {
+        height: currentFrameHeight(),
+    });
+}
+
+function addPiece(code) {
+    const piece = libraryByCode[code];
+    if (!piece) { return; }
+    const newPlacement = {
+        id: 'placement-' + nextId++,
+        code,
+        x: boardCenter.x,
+        y: boardCenter.y,
+        rotation: 0,
+        flipped: false,
+        _piece: piece,
+    };
+    placements.push(newPlacement);
+    invalidateSections();
+    if (!placementById.has(newPlacement.id)) {
+        placementById.set(newPlacement.id, newPlacement);
+    }
+    selectedId = newPlacement.id;
+    resetDragSection();
+    updateSelectionLabel();
+    draw();
+    emitState();
+}
+
+function applyBoardPayload(payload, options = {}) {
+    if (!payload || typeof payload !== 'object') { return; }
+    const { recenter = false, emit = false } = options;
+    if (typeof payload.description === 'string') {
+        boardData.description = payload.description;
+    }
+    if (Array.isArray(payload.polygon) && payload.polygon.length) {
+        polygon = payload.polygon.map(clonePoint);
+    } else if (!polygon.length) {
+        polygon = defaultPolygon();
+    }
+    if (typeof payload.orientation === 'number') {
+        boardOrientation = payload.orientation;
+    }
+    recalculateBoardGeometry();
+    if (recenter) {
+        pan = { x: 0, y: 0 };
+    }
+    clampPan();
+    draw();
+    updateBoardOrientationLabel();
+    if (emit) {
+        emitState();
+    }
+}
+
+function applyRenderArgs(args) {
+    if (!args || typeof args !== 'object') { return; }
+    // Report a debounced button edit before these args replace the local
+    // placements, so the edit is not lost to an older render.
+    flushPendingEmit();
+    const previousSelectedId = selectedId;
+    selectedCircleId = null;
+    guideCircles = [];
+    if (Array.isArray(args.library)) {
+        trackLibrary = args.library;
+    }
+    libraryByCode = Object.fromEntries(trackLibrary.map(item => [item.code, item]));
+    attachPieces();
+    clearPiecePaths();
+    invalidateSections();
+    renderLibrarySections();
+    if (args.board) {
+        applyBoardPayload(args.board);
+    } else {
+        recalculateBoardGeometry();
+    }
+    if (Array.isArray(args.placements)) {
+        placements = args.placements.map((item, idx) => ({
+            id: item.id || ('placement-' + idx),
+            code: item.code,
+            x: typeof item.x === 'number' ? item.x : 0,
+            y: typeof item.y === 'number' ? item.y : 0,
+            rotation: typeof item.rotation === 'number' ? item.rotation : 0,
+            flipped: Boolean(item.flipped),
+            _piece: libraryByCode[item.code],
+        }));
+        nextId = placements.length;
+        rebuildPlacementIndex();
+        invalidateSections();
+    }
+    if (typeof args.zoom === 'number') {
+        zoom = Math.min(Math.max(args.zoom, MIN_ZOOM), MAX_ZOOM);
+        updateZoomUI();
+    }
+    if (args.pan && typeof args.pan === 'object') {
+        const panX = Number(args.pan.x);
+        const panY = Number(args.pan.y);
+        if (Number.isFinite(panX) && Number.isFinite(panY)) {
+            pan.x = panX;
+            pan.y = panY;
+        }
+    }
+    let resolvedSelectedId = null;
+    if (previousSelectedId && placementById.has(previousSelectedId)) {
+        resolvedSelectedId = previousSelectedId;
+    }
+    if (!resolvedSelectedId && placements.length) {
+        resolvedSelectedId = placements[placements.length - 1].id;
+    }
+    selectedId = resolvedSelectedId;
+    clampPan();
+    draw();
+    updateBoardOrientationLabel();
+    updateSelectionLabel();
+    renderCircleList();
+    requestFrameHeight();
+}
+
+function updateSelectionLabel() {
+    const placement = getPlacementById(selectedId);
+    const circle = getCircleById(selectedCircleId);
+    if (placement) {
+        const piece = pieceFor(placement);
+        selectionLabel.textContent = placement.code + ' · ' + (piece ? piece.name : '');
+        return;
+    }
+    if (circle) {
+        selectionLabel.textContent = circle.label || `Guide circle · ${circle.radius.toFixed(0)} mm`;
+        return;
+    }
+    selectionLabel.textContent = 'No piece selected';
+}
+
+if (zoomSlider) {
+    zoomSlider.addEventListener('input', event => {
+        const target = parseFloat(event.target.value);
+        if (Number.isFinite(target)) {
+            setZoom(target, { x: canvas.width / 2, y: canvas.height / 2 });
+        }
+    });
+}
+
+if (resetViewButton) {
+    resetViewButton.addEventListener('click', () => {
+        resetView();
+    });
+}
+
+if (rotateBoardLeftButton) {
+    rotateBoardLeftButton.addEventListener('click', () => rotateBoard(-90));
+}
+if (rotateBoardRightButton) {
+    rotateBoardRightButton.addEventListener('click', () => rotateBoard(90));
+}
+
+let dragging = false;
+let dragOffset = { x: 0, y: 0 };
+let pendingDragPointer = null;
+let dragFrameScheduled = false;
+let viewPanning = false;
+let panPointerStart = { x: 0, y: 0 };
+let panStart = { x: 0, y: 0 };
+let middleButtonPressed = false;
+
+canvas.addEventListener('pointerdown', event => {
+    if (event.button === 1) {
+        middleButtonPressed = true;
+    }
+    const rect = canvas.getBoundingClientRect();
+    const { x, y } = canvasToMm(event.clientX - rect.left, event.clientY - rect.top);
+
+    let foundPlacement = null;
+    for (let i = placements.length - 1; i >= 0; i -= 1) {
+        if (hitTest(placements[i], x, y)) {
+            foundPlacement = placements[i];
+            break;
+        }
+    }
+
+    if (foundPlacement) {
+        selectedId = foundPlacement.id;
+        selectedCircleId = null;
+        dragOffset = { x: x - foundPlacement.x, y: y - foundPlacement.y };
+        dragging = true;
+        viewPanning = false;
+        canvas.setPointerCapture(event.pointerId);
+        const sectionIds = sectionMode ? connectedSectionIds(foundPlacement.id) : [foundPlacement.id];
+        dragSectionIds = sectionIds;
+        dragStartX = new Float64Array(sectionIds.length);
+        dragStartY = new Float64Array(sectionIds.length);
+        dragLeaderIndex = sectionIds.indexOf(foundPlacement.id);
+        sectionIds.forEach((id, index) => {
+            const piece = getPlacementById(id);
+            if (piece) {
+                dragStartX[index] = piece.x;
+                dragStartY[index] = piece.y;
+            }
+        });
+        updateSelectionLabel();
+        scheduleDraw();
+        return;
+    }
+
+    for (let i = guideCircles.length - 1; i >= 0; i -= 1) {
+        const circle = guideCircles[i];
+        const dx = x - circle.x;
+        const dy = y - circle.y;
+        const handleRadius = getGuideCircleHandleRadiusMm(circle);
+        if (dx * dx + dy * dy <= handleRadius * handleRadius) {
+            selectedCircleId = circle.id;
+            selectedId = null;
+            draggingCircleId = circle.id;
+            circleDragOffset = { x: x - circle.x, y: y - circle.y };
+            canvas.setPointerCapture(event.pointerId);
+            updateSelectionLabel();
+            renderCircleList();
+            scheduleDraw();
+            return;
+        }
+    }
+
+    selectedId = null;
+    selectedCircleId = null;
+    resetDragSection();
+    viewPanning = false;
+    updateSelectionLabel();
+    if (event.button === 0) {
+        viewPanning = true;
+        panPointerStart = { x: event.clientX, y: event.clientY };
+        panStart = { x: pan.x, y: pan.y };
+        canvas.setPointerCapture(event.pointerId);
+        event.preventDefault();
+    }
+    scheduleDraw();
+});
+
+canvas.addEventListener('pointermove', event => {
+    if (draggingCircleId) {
+        event.preventDefault();
+        const rect = canvas.getBoundingClientRect();
+        const { x, y } = canvasToMm(event.clientX - rect.left, event.clientY - rect.top);
+        const circle = getCircleById(draggingCircleId);
+        if (circle) {
+            circle.x = x - circleDragOffset.x;
+            circle.y = y - circleDragOffset.y;
+            scheduleDraw();
+        }
+        return;
+    }
+    if (viewPanning) {
+        event.preventDefault();
+        const dx = event.clientX - panPointerStart.x;
+        const dy = event.clientY - panPointerStart.y;
+        pan.x = panStart.x + dx;
+        pan.y = panStart.y + dy;
+        clampPan();
+        scheduleDraw();
+        return;
+    }
+    if (!dragging || !selectedId) { return; }
+    const rect = canvas.getBoundingClientRect();
+    pendingDragPointer = { x: event.clientX - rect.left, y: event.clientY - rect.top };
+    if (dragFrameScheduled) { return; }
+    dragFrameScheduled = true;
+    requestAnimationFrame(() => {
+        dragFrameScheduled = false;
+        applyPendingDrag();
+        draw();
+    });
+});
+
+function applyPendingDrag() {
+    const pointer = pendingDragPointer;
+    pendingDragPointer = null;
+    if (!pointer || !dragging || !selectedId) { return; }
+    const placement = getPlacementById(selectedId);
+    if (!placement) { return; }
+    const { x, y } = canvasToMm(pointer.x, pointer.y);
+    const hasLeader = dragLeaderIndex >= 0 && dragSectionIds[dragLeaderIndex] === selectedId;
+    const initialX = hasLeader ? dragStartX[dragLeaderIndex] : placement.x;
+    const initialY = hasLeader ? dragStartY[dragLeaderIndex] : placement.y;
+    const deltaX = x - dragOffset.x - initialX;
+    const deltaY = y - dragOffset.y - initialY;
+    for (let k = 0; k < dragSectionIds.length; k += 1) {
+        const piece = getPlacementById(dragSectionIds[k]);
+        if (!piece) { continue; }
+        piece.x = dragStartX[k] + deltaX;
+        piece.y = dragStartY[k] + deltaY;
+    }
+    invalidateSections();
+}
+
+canvas.addEventListener('pointerup', event => {
+    if (event.button === 1) {
+        middleButtonPressed = false;
+    }
+    if (canvas.hasPointerCapture(event.pointerId)) {
+        canvas.releasePointerCapture(event.pointerId);
+    }
+    let shouldEmit = false;
+    if (dragging) {
+        // Apply a move that arrived after the last animation frame.
+        applyPendingDrag();
+        dragging = false;
+        resetDragSection();
+        shouldEmit = true;
+    }
+    if (viewPanning) {
+        viewPanning = false;
+        shouldEmit = true;
+    }
+    if (draggingCircleId) {
+        draggingCircleId = null;
+        renderCircleList();
+        shouldEmit = true;
+    }
+    if (shouldEmit) {
+        emitState();
+    }
+});
+
+canvas.addEventListener('pointercancel', event => {
+    middleButtonPressed = false;
+    if (canvas.hasPointerCapture(event.pointerId)) {
+        canvas.releasePointerCapture(event.pointerId);
+    }
+    let shouldEmit = false;
+    if (dragging) {
+        // Apply a move that arrived after the last animation frame.
+        applyPendingDrag();
+        dragging = false;
+        resetDragSection();
+        shouldEmit = true;
+    }
+    if (viewPanning) {
+        viewPanning = false;
+        shouldEmit = true;
+    }
+    if (draggingCircleId) {
+        draggingCircleId = null;
+        renderCircleList();
+        shouldEmit = true;
+    }
+    if (shouldEmit) {
+        emitState();
+    }
+});
+
+canvas.addEventListener('wheel', event => {
+    const isZooming = event.ctrlKey || event.metaKey;
+    const isPanning = !isZooming && (event.shiftKey || middleButtonPressed);
+    if (!isZooming && !isPanning) {
+        return;
+    }
+    event.preventDefault();
+    if (isZooming) {
+        const rect = canvas.getBoundingClientRect();
+        const focus = {
+            x: event.clientX - rect.left,
+            y: event.clientY - rect.top,
+        };
+        const zoomFactor = Math.exp(-event.deltaY * 0.0015);
+        setZoom(zoom * zoomFactor, focus);
+    } else {
+        pan.x -= event.deltaX;
+        pan.y -= event.deltaY;
+        clampPan();
+        scheduleDraw();
+        emitState();
+    }
+}, { passive: false });
+
+function hitTest(placement, x, y) {
+    const piece = pieceFor(placement);
+    if (!piece) { return false; }
+    const rotation = (placement.rotation || 0) * Math.PI / 180;
+    const dx = x - placement.x;
+    const dy = y - placement.y;
+    if (piece.kind === 'curve' && piece.radius) {
+        // Reject points outside the 60 mm band around the centreline without
+        // taking a square root.
+        const distanceSq = dx * dx + dy * dy;
+        const outer = piece.radius + 60;
+        const inner = piece.radius - 60;
+        if (distanceSq >= outer * outer || (inner > 0 && distanceSq <= inner * inner)) {
+            return false;
+        }
+        if (!piece.angle) {
+            return true;
+        }
+        const pointerAngle = normalizeRadians(Math.atan2(dy, dx) - rotation);
+        const orientation = placement.flipped ? -1 : 1;
+        const adjustedAngle = normalizeRadians(pointerAngle * orientation);
+        const halfSweep = toRadians(piece.angle) / 2;
+        return adjustedAngle >= -halfSweep && adjustedAngle <= halfSweep;
+    }
+    const { sin, cos } = sinCos(rotation);
+    const localX = cos * dx + sin * dy;
+    const localY = -sin * dx + cos * dy;
+    const length = piece.displayLength || piece.length || 0;
+    return Math.abs(localX) <= length / 2 && Math.abs(localY) <= 50;
+}
+
+function adjustSelected(deltaRotation = 0, deltaX = 0, deltaY = 0) {
+    const placement = getPlacementById(selectedId);
+    if (!placement) { return; }
+    const pivot = { x: placement.x, y: placement.y };
+    const sectionIds = sectionMode ? connectedSectionIds(selectedId) : [selectedId];
+    applySectionTransform(sectionIds, pivot, deltaRotation, deltaX, deltaY);
+    draw();
+    scheduleEmit();
+}
+
+document.getElementById('rotateLeft').addEventListener('click', () => adjustSelected(-15, 0, 0));
+document.getElementById('rotateRight').addEventListener('click', () => adjustSelected(15, 0, 0));
+document.getElementById('nudgeUp').addEventListener('click', () => adjustSelected(0, 0, 10));
+document.getElementById('nudgeDown').addEventListener('click', () => adjustSelected(0, 0, -10));
+document.getElementById('nudgeLeft').addEventListener('click', () => adjustSelected(0, -10, 0));
+document.getElementById('nudgeRight').addEventListener('click', () => adjustSelected(0, 10, 0));
+document.getElementById('flipPiece').addEventListener('click', () => {
+    const placement = getPlacementById(selectedId);
+    if (!placement) { return; }
+    placement.flipped = !placement.flipped;
+    invalidateSections();
+    draw();
+    scheduleEmit();
+});
+
+document.getElementById('snapGrid').addEventListener('click', () => {
+    const placement = getPlacementById(selectedId);
+    if (!placement) { return; }
+    const targetX = Math.round(placement.x / 10) * 10;
+    const targetY = Math.round(placement.y / 10) * 10;
+    const targetRotation = Math.round((placement.rotation || 0) / 15) * 15;
+    const deltaX = targetX - placement.x;
+    const deltaY = targetY - placement.y;
+    const deltaRotation = normalizeDegrees(targetRotation - (placement.rotation || 0));
+    const pivot = { x: placement.x, y: placement.y };
+    const sectionIds = sectionMode ? connectedSectionIds(selectedId) : [selectedId];
+    applySectionTransform(sectionIds, pivot, deltaRotation, deltaX, deltaY);
+    const updatedPlacement = getPlacementById(selectedId);
+    if (updatedPlacement) {
+        updatedPlacement.rotation = ((targetRotation % 360) + 360) % 360;
+        invalidateSections();
+    }
+    draw();
+    scheduleEmit();
+});
+
+document.getElementById('snapPiece').addEventListener('click', () => {
+    const placement = getPlacementById(selectedId);
+    if (!placement) { return; }
+    const transform = findBestSnapTransform(placement);
+    if (!transform) { return; }
+    const pivot = { x: placement.x, y: placement.y };
+    const sectionIds = sectionMode ? connectedSectionIds(selectedId) : [selectedId];
+    applySectionTransform(sectionIds, pivot, transform.deltaRotationDeg, transform.deltaX, transform.deltaY);
+    draw();
+    scheduleEmit();
+});
+
+const sectionToggleButton = document.getElementById('toggleSectionMode');
+
+function updateSectionToggleButton() {
+    if (!sectionToggleButton) { return; }
+    sectionToggleButton.textContent = sectionMode ? 'Section move: On' : 'Section move: Off';
+    sectionToggleButton.classList.toggle('primary', sectionMode);
+}
+
+if (sectionToggleButton) {
+    sectionToggleButton.addEventListener('click', () => {
+        sectionMode = !sectionMode;
+        if (!sectionMode) {
+            resetDragSection();
+        }
+        updateSectionToggleButton();
+    });
+}
+document.getElementById('deletePiece').addEventListener('click', () => {
+    if (selectedCircleId) {
+        const circleIndex = guideCircles.findIndex(circle => circle.id === selectedCircleId);
+        if (circleIndex !== -1) {
+            guideCircles.splice(circleIndex, 1);
+            selectedCircleId = guideCircles.length ? guideCircles[guideCircles.length - 1].id : null;
+            renderCircleList();
+            updateSelectionLabel();
+            scheduleCommit();
+            return;
+        }
+    }
+    const index = placements.findIndex(p => p.id === selectedId);
+    if (index === -1) { return; }
+    placements.splice(index, 1);
+    rebuildPlacementIndex();
+    invalidateSections();
+    selectedId = placements.length ? placements[placements.length - 1].id : null;
+    resetDragSection();
+    updateSelectionLabel();
+    scheduleCommit();
+});
+
+function renderCircleList() {
+    if (!circleListContainer) { return; }
+    if (!guideCircles.length) {
+        circleListContainer.innerHTML = '<p class="hint">No planning circles added yet.</p>';
+        requestFrameHeight();
+        return;
+    }
+    const entries = guideCircles.map(circle => {
+        const selected = circle.id === selectedCircleId ? ' selected' : '';
+        const label = circle.label || `Radius ${circle.radius.toFixed(0)} mm`;
+        const position = `Centre ${circle.x.toFixed(0)} mm · ${circle.y.toFixed(0)} mm`;
+        const colour = circle.color || '#ff7f0e';
+        return `
+            <div class="circle-item${selected}" data-id="${circle.id}">
+                <span class="circle-swatch" style="background:${colour}"></span>
+                <div class="circle-meta">
+                    <div><strong>${label}</strong></div>
+                    <div>${position}</div>
+                </div>
+                <div class="circle-actions">
+                    <button type="button" data-action="remove" data-id="${circle.id}">Remove</button>
+                </div>
+            </div>
+        `;
+    });
+    circleListContainer.innerHTML = entries.join('');
+    circleListContainer.querySelectorAll('.circle-item').forEach(item => {
+        item.addEventListener('click', () => {
+            const id = item.getAttribute('data-id');
+            if (!id) { return; }
+            selectedCircleId = id;
+            selectedId = null;
+            updateSelectionLabel();
+            renderCircleList();
+            scheduleCommit();
+        });
+    });
+    circleListContainer.querySelectorAll('button[data-action="remove"]').forEach(button => {
+        button.addEventListener('click', event => {
+            event.stopPropagation();
+            const id = event.currentTarget.getAttribute('data-id');
+            const index = guideCircles.findIndex(circle => circle.id === id);
+            if (index !== -1) {
+                guideCircles.splice(index, 1);
+                if (selectedCircleId === id) {
+                    selectedCircleId = guideCircles.length ? guideCircles[guideCircles.length - 1].id : null;
+                }
+                renderCircleList();
+                updateSelectionLabel();
+                scheduleCommit();
+            }
+        });
+    });
+    requestFrameHeight();
+}
+
+const saveLayoutButton = document.getElementById('saveLayout');
+if (saveLayoutButton) {
+    saveLayoutButton.addEventListener('click', () => {
+        const payload = emitState({ immediate: true });
+        const jsonText = JSON.stringify(payload, null, 2);
+        const blob = new Blob([jsonText], { type: 'application/json' });
+        const url = URL.createObjectURL(blob);
+        const link = document.createElement('a');
+        link.href = url;
+        const timestamp = new Date().toISOString().replace(/[:.]/g, '-');
+        link.download = `layout-${timestamp}.json`;
+        pageBody.appendChild(link);
+        link.click();
+        pageBody.removeChild(link);
+        setTimeout(() => URL.revokeObjectURL(url), 1000);
+    });
+}
+
+if (window.Streamlit && window.Streamlit.events && window.Streamlit.RENDER_EVENT) {
+    window.Streamlit.events.addEventListener(window.Streamlit.RENDER_EVENT, event => {
+        const detail = event && event.detail ? event.detail : {};
+        applyRenderArgs(detail.args || {});
+    });
+} else {
+    window.addEventListener('message', event => {
+        if (event && event.data && event.data.type === 'streamlit:render') {
+            applyRenderArgs(event.data.args || {});
+        }
+    });
+}
+
+let resizeScheduled = false;
+
+window.addEventListener('resize', () => {
+    if (resizeScheduled) { return; }
+    resizeScheduled = true;
+    requestAnimationFrame(() => {
+        resizeScheduled = false;
+        resizeCanvas();
+        requestFrameHeight();
+    });
+}, { passive: true });
+resizeCanvas();
+updateSelectionLabel();
+updateSectionToggleButton();
+renderCircleList();
+requestFrameHeight();
+announceReady();
@@ -1,43 +1,53 @@
 from __future__ import annotations
 
+import hashlib
 import json
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 import streamlit as st
-import streamlit.components.v1 as components
 
 from planner import (
     BoardSpecification,
     describe_board,
     hornby_track_library,
     inventory_from_placements,
+    inventory_run_length_mm,
     layout_resistance_ohms,
     estimate_layout_power,
-    total_run_length_mm,
+    parse_polygon_text,
+    piece_display_length,
 )
 
 
 _COMPONENT_DIR = Path(__file__).parent / "_layout_designer_component"
-_COMPONENT_DIR.mkdir(exist_ok=True)
-_COMPONENT_INDEX = _COMPONENT_DIR / "index.html"
-_layout_designer_component = components.declare_component(
-    "layout_designer",
-    path=str(_COMPONENT_DIR),
-)
 
 
-st.set_page_config(page_title="Hornby OO Layout Planner", layout="wide")
-st.markdown(
-    """
+@st.cache_resource(show_spinner=False)
+def _get_layout_designer_component():
+    """Declare the layout designer component once and reuse it across reruns."""
+
+    import streamlit.components.v1 as components
+
+    _COMPONENT_DIR.mkdir(exist_ok=True)
+    return components.declare_component(
+        "layout_designer",
+        path=str(_COMPONENT_DIR),
+    )
+
+
+_HIDE_STATUS_WIDGET_CSS = """
     <style>
     [data-testid="stStatusWidget"] {
         display: none !important;
     }
     </style>
-    """,
-    unsafe_allow_html=True,
-)
+    """
+
+
+st.set_page_config(page_title="Hornby OO Layout Planner", layout="wide")
+st.markdown(_HIDE_STATUS_WIDGET_CSS, unsafe_allow_html=True)
 st.title("Hornby OO Gauge Layout Planner")
 st.write(
     """Lay out your own Hornby OO gauge plan directly on the baseboard outline.\n"
@@ -46,6 +56,38 @@ st.write(
 )
 
 
+def _to_float(value: object, default: float = 0.0) -> float:
+    """Coerce JSON numbers and numeric strings to float, falling back to default."""
+
+    try:
+        return float(value)  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        return default
+
+
+def _normalise_placement(idx: int, raw_item: object) -> Optional[Dict[str, object]]:
+    """Return a clean placement dict for one layout entry, or None to skip it."""
+
+    if type(raw_item) is not dict:
+        return None
+    get = raw_item.get
+    code = get("code")
+    if type(code) is not str or not code:
+        return None
+    placement_id = get("id")
+    if type(placement_id) is not str or not placement_id:
+        placement_id = f"placement-{idx}"
+
+    return {
+        "id": placement_id,
+        "code": code,
+        "x": _to_float(get("x"), 0.0),
+        "y": _to_float(get("y"), 0.0),
+        "rotation": _to_float(get("rotation"), 0.0),
+        "flipped": bool(get("flipped", False)),
+    }
+
+
 def _normalise_layout_payload(
     data: object,
 ) -> Tuple[List[Dict[str, object]], Optional[float], Optional[Tuple[float, float]]]:
@@ -71,51 +113,31 @@ def _normalise_layout_payload(
     if not isinstance(placements_payload, list):
         raise ValueError("Layout JSON must contain a list of placements.")
 
-    def _to_float(value: object, default: float = 0.0) -> float:
-        if isinstance(value, (int, float)):
-            return float(value)
-        if isinstance(value, str):
-            try:
-                return float(value)
-            except ValueError:
-                return default
-        return default
+    if not placements_payload:
+        return [], zoom_value, pan_value
 
-    normalised: List[Dict[str, object]] = []
-    saw_item = False
-    for idx, raw_item in enumerate(placements_payload):
-        saw_item = True
-        if not isinstance(raw_item, dict):
-            continue
-        code = raw_item.get("code")
-        if not isinstance(code, str) or not code:
-            continue
-        placement_id = raw_item.get("id")
-        if not isinstance(placement_id, str) or not placement_id:
-            placement_id = f"placement-{idx}"
-
-        x_val = _to_float(raw_item.get("x"), 0.0)
-        y_val = _to_float(raw_item.get("y"), 0.0)
-        rotation_val = _to_float(raw_item.get("rotation"), 0.0)
-        flipped_val = bool(raw_item.get("flipped", False))
-
-        normalised.append(
-            {
-                "id": placement_id,
-                "code": code,
-                "x": x_val,
-                "y": y_val,
-                "rotation": rotation_val,
-                "flipped": flipped_val,
-            }
-        )
-
-    if saw_item and not normalised:
+    normalised: List[Dict[str, object]] = [
+        placement
+        for placement in map(_normalise_placement, range(len(placements_payload)), placements_payload)
+        if placement is not None
+    ]
+    if not normalised:
         raise ValueError("No valid placements were found in the layout JSON.")
 
     return normalised, zoom_value, pan_value
 
 
+_SESSION_DEFAULTS: Dict[str, object] = {
+    "placements": [],
+    "zoom": 1.0,
+    "board_orientation": 0.0,
+    "pan": (0.0, 0.0),
+}
+
+
+_DEFAULT_CUSTOM_POLYGON_TEXT = "0,0\n2400,0\n2400,1200\n0,1200"
+
+
 def _board_controls(container) -> BoardSpecification:
     container.header("Board outline")
     shape = container.selectbox(
@@ -158,52 +180,70 @@ def _board_controls(container) -> BoardSpecification:
         "Enter the corner points of your board outline in millimetres. "
         "Provide one point per line in the format `x,y`."
     )
-    default_points: List[Tuple[float, float]] = [
-        (0.0, 0.0),
-        (2400.0, 0.0),
-        (2400.0, 1200.0),
-        (0.0, 1200.0),
-    ]
-    default_text = "\n".join(f"{x:.0f},{y:.0f}" for x, y in default_points)
     polygon_text = container.text_area(
         "Corner points",
-        value=default_text,
+        value=_DEFAULT_CUSTOM_POLYGON_TEXT,
         key="custom_polygon",
         height=160,
     )
-    polygon: List[Tuple[float, float]] = []
-    invalid_lines = 0
-    for line in polygon_text.splitlines():
-        if not line.strip():
-            continue
-        parts = line.split(",")
-        if len(parts) != 2:
-            invalid_lines += 1
-            continue
-        try:
-            x_val = float(parts[0].strip())
-            y_val = float(parts[1].strip())
-        except ValueError:
-            invalid_lines += 1
-            continue
-        polygon.append((x_val, y_val))
+    polygon, invalid_lines = parse_polygon_text(polygon_text)
     if invalid_lines:
         container.warning(
             f"Skipped {invalid_lines} line{'s' if invalid_lines != 1 else ''} with invalid coordinates."
         )
-    width = max((p[0] for p in polygon), default=0.0)
-    height = max((p[1] for p in polygon), default=0.0)
+    if polygon:
+        xs, ys = zip(*polygon)
+        width, height = max(xs), max(ys)
+    else:
+        width = height = 0.0
     return BoardSpecification(shape="custom", width=width, height=height, polygon=polygon)
 
 
+@st.cache_resource(show_spinner=False)
+def _track_payload() -> List[Dict[str, object]]:
+    """Serialise the static track catalogue once for the designer component."""
+
+    return [
+        {
+            "code": piece.code,
+            "name": piece.name,
+            "kind": piece.kind,
+            "length": piece.length,
+            "angle": piece.angle,
+            "radius": piece.radius,
+            "displayLength": piece.arc_length() if piece.kind == "curve" else piece.length,
+        }
+        for piece in hornby_track_library().values()
+    ]
+
+
+@st.cache_resource(show_spinner=False)
+def _inventory_labels() -> Dict[str, Tuple[str, str]]:
+    """Map each catalogue code to its inventory table name and length text."""
+
+    return {
+        code: (piece.name, f"{piece_display_length(piece):.0f}")
+        for code, piece in hornby_track_library().items()
+    }
+
+
+@dataclass(frozen=True)
+class DesignerResult:
+    """State reported back by the layout designer for the current rerun."""
+
+    placements: List[Dict[str, object]]
+    zoom: float
+    pan: Tuple[float, float]
+    state_changed: bool = False
+
+
 def _designer(
-    board: BoardSpecification,
+    board_polygon: List[Tuple[float, float]],
+    board_description: str,
     placements: List[Dict[str, object]],
     initial_zoom: float,
     initial_pan: Tuple[float, float],
-) -> Tuple[List[Dict[str, object]], float, Tuple[float, float]]:
-    library = hornby_track_library()
-    board_polygon = board.polygon_points()
+) -> DesignerResult:
     min_zoom = 0.4
     max_zoom = 3.0
     try:
@@ -220,23 +260,13 @@ def _designer(
     current_pan = (pan_x, pan_y)
     board_payload = {
         "polygon": board_polygon,
-        "description": describe_board(board),
+        "description": board_description,
         "orientation": float(st.session_state.get("board_orientation", 0.0)),
     }
-    track_payload = [
-        {
-            "code": piece.code,
-            "name": piece.name,
-            "kind": piece.kind,
-            "length": piece.length,
-            "angle": piece.angle,
-            "radius": piece.radius,
-            "displayLength": piece.arc_length() if piece.kind == "curve" else piece.length,
-        }
-        for piece in library.values()
-    ]
+    track_payload = _track_payload()
 
-    component_value = _layout_designer_component(
+    layout_designer = _get_layout_designer_component()
+    component_value = layout_designer(
         key="layout-designer",
         default=None,
         board=board_payload,
@@ -245,28 +275,31 @@ def _designer(
         zoom=current_zoom,
         pan={"x": pan_x, "y": pan_y},
     )
-    state_changed = False
-
-    if component_value is None:
-        return placements, current_zoom, current_pan, state_changed
+    unchanged = DesignerResult(placements, current_zoom, current_pan)
 
     if not isinstance(component_value, str):
-        return placements, current_zoom, current_pan, state_changed
+        return unchanged
+
+    # The component keeps returning its last value on every rerun; only a new
+    # value can carry edits that are not already in the session state.
+    if component_value == st.session_state.get("_designer_last_value"):
+        return unchanged
+    st.session_state["_designer_last_value"] = component_value
 
     try:
         parsed = json.loads(component_value)
     except json.JSONDecodeError:
-        return placements, current_zoom, current_pan, state_changed
+        return unchanged
 
     if not isinstance(parsed, dict):
-        return placements, current_zoom, current_pan, state_changed
-
-    state_changed = True
+        return unchanged
 
+    orientation_changed = False
     board_state = parsed.get("board")
     if isinstance(board_state, dict):
         orientation_value = board_state.get("orientation")
         if isinstance(orientation_value, (int, float)):
+            orientation_changed = float(orientation_value) != board_payload["orientation"]
             st.session_state["board_orientation"] = float(orientation_value)
 
     payload = parsed.get("placements")
@@ -286,7 +319,16 @@ def _designer(
         if isinstance(pan_x_value, (int, float)) and isinstance(pan_y_value, (int, float)):
             current_pan = (float(pan_x_value), float(pan_y_value))
 
-    return updated, current_zoom, current_pan, state_changed
+    if updated == placements:
+        # Keep the session's list so unchanged placements are not rewritten.
+        updated = placements
+    state_changed = (
+        orientation_changed
+        or updated is not placements
+        or current_zoom != unchanged.zoom
+        or current_pan != unchanged.pan
+    )
+    return DesignerResult(updated, current_zoom, current_pan, state_changed=state_changed)
 
 
 
@@ -295,7 +337,9 @@ def _designer(
 controls_column, planning_column = st.columns([3, 2])
 
 board = _board_controls(controls_column)
-controls_column.success(describe_board(board))
+board_polygon = board.polygon_points()
+board_description = describe_board(board)
+controls_column.success(board_description)
 
 planning_column.header("Power planning")
 supply_voltage = planning_column.number_input(
@@ -319,27 +363,30 @@ uploaded_layout = planning_column.file_uploader("Load layout JSON", type=["json"
 download_placeholder = planning_column.empty()
 
 
-if "placements" not in st.session_state:
-    st.session_state["placements"] = []
-
-if "zoom" not in st.session_state:
-    st.session_state["zoom"] = 1.0
-
-if "board_orientation" not in st.session_state:
-    st.session_state["board_orientation"] = 0.0
-
-if "pan" not in st.session_state:
-    st.session_state["pan"] = (0.0, 0.0)
-
-if uploaded_layout is not None:
+for state_key, default_value in _SESSION_DEFAULTS.items():
+    if state_key not in st.session_state:
+        # Copy mutable defaults so sessions never share the same list.
+        if isinstance(default_value, list):
+            default_value = list(default_value)
+        st.session_state[state_key] = default_value
+
+uploaded_bytes = uploaded_layout.getvalue() if uploaded_layout is not None else None
+uploaded_digest = hashlib.sha1(uploaded_bytes).hexdigest() if uploaded_bytes is not None else None
+# The uploader keeps returning the same file on every rerun; only load it when
+# it first appears so later edits in the designer are not overwritten. The
+# outcome is kept with the digest so its message stays up while the file does.
+layout_status = st.session_state.get("_loaded_layout_status")
+if uploaded_digest is None:
+    st.session_state.pop("_loaded_layout_status", None)
+    layout_status = None
+elif layout_status is None or layout_status[0] != uploaded_digest:
     try:
-        raw_text = uploaded_layout.getvalue().decode("utf-8")
-        parsed_payload = json.loads(raw_text)
+        parsed_payload = json.loads(uploaded_bytes.decode("utf-8"))
         loaded_placements, loaded_zoom, loaded_pan = _normalise_layout_payload(parsed_payload)
     except UnicodeDecodeError:
-        planning_column.error("Could not decode the uploaded file. Please upload UTF-8 JSON.")
+        layout_status = (uploaded_digest, False, "Could not decode the uploaded file. Please upload UTF-8 JSON.")
     except (json.JSONDecodeError, ValueError) as exc:
-        planning_column.error(f"Unable to load layout: {exc}")
+        layout_status = (uploaded_digest, False, f"Unable to load layout: {exc}")
     else:
         st.session_state["placements"] = loaded_placements
         if loaded_zoom is not None:
@@ -352,41 +399,73 @@ if uploaded_layout is not None:
                 orientation_value = board_payload.get("orientation")
                 if isinstance(orientation_value, (int, float)):
                     st.session_state["board_orientation"] = float(orientation_value)
-        planning_column.success(f"Loaded {len(loaded_placements)} placement{'s' if len(loaded_placements) != 1 else ''} from layout.")
+        layout_status = (
+            uploaded_digest,
+            True,
+            f"Loaded {len(loaded_placements)} placement{'s' if len(loaded_placements) != 1 else ''} from layout.",
+        )
+    st.session_state["_loaded_layout_status"] = layout_status
+
+if layout_status is not None:
+    _, layout_loaded, layout_message = layout_status
+    if layout_loaded:
+        planning_column.success(layout_message)
+    else:
+        planning_column.error(layout_message)
 
 placements: List[Dict[str, object]] = st.session_state["placements"]
 current_zoom: float = float(st.session_state.get("zoom", 1.0))
 initial_pan: Tuple[float, float] = tuple(st.session_state.get("pan", (0.0, 0.0)))  # type: ignore[arg-type]
-placements, current_zoom, current_pan, state_changed = _designer(
-    board, placements, current_zoom, initial_pan
-)
-st.session_state["placements"] = placements
-st.session_state["zoom"] = current_zoom
-st.session_state["pan"] = current_pan
-if state_changed:
+designer_result = _designer(board_polygon, board_description, placements, current_zoom, initial_pan)
+placements = designer_result.placements
+current_zoom = designer_result.zoom
+current_pan = designer_result.pan
+# Only write back values the designer actually changed; an idle rerun hands
+# back the same objects it was given.
+if st.session_state["placements"] is not placements:
+    st.session_state["placements"] = placements
+if st.session_state["zoom"] != current_zoom:
+    st.session_state["zoom"] = current_zoom
+if st.session_state["pan"] != current_pan:
+    st.session_state["pan"] = current_pan
+if designer_result.state_changed:
     st.rerun()
 
-layout_payload = {
-    "placements": placements,
-    "board": {
-        "description": describe_board(board),
-        "polygon": board.polygon_points(),
-        "orientation": float(st.session_state.get("board_orientation", 0.0)),
-    },
-    "zoom": current_zoom,
-    "pan": {"x": float(current_pan[0]), "y": float(current_pan[1])},
-}
+board_orientation = float(st.session_state.get("board_orientation", 0.0))
+download_key = (board_description, board_polygon, board_orientation, current_zoom, current_pan)
+download_cache = st.session_state.get("_download_cache")
+# Placement lists are replaced rather than mutated, so an identity check on the
+# cached list plus the view/board key tells whether the JSON is still current.
+if download_cache is not None and download_cache[0] is placements and download_cache[1] == download_key:
+    layout_json = download_cache[2]
+else:
+    layout_payload = {
+        "placements": placements,
+        "board": {
+            "description": board_description,
+            "polygon": board_polygon,
+            "orientation": board_orientation,
+        },
+        "zoom": current_zoom,
+        "pan": {"x": float(current_pan[0]), "y": float(current_pan[1])},
+    }
+    layout_json = json.dumps(layout_payload, separators=(",", ":"))
+    st.session_state["_download_cache"] = (placements, download_key, layout_json)
 download_placeholder.download_button(
     "Download layout JSON",
-    data=json.dumps(layout_payload, indent=2),
+    data=layout_json,
     file_name="layout.json",
     mime="application/json",
 )
 
 
-library = hornby_track_library()
-inventory = inventory_from_placements(placements)
-total_length_mm = total_run_length_mm(placements)
+inventory_cache = st.session_state.get("_inventory_cache")
+if inventory_cache is not None and inventory_cache[0] is placements:
+    inventory, total_length_mm = inventory_cache[1], inventory_cache[2]
+else:
+    inventory = inventory_from_placements(placements)
+    total_length_mm = inventory_run_length_mm(inventory)
+    st.session_state["_inventory_cache"] = (placements, inventory, total_length_mm)
 total_length_m = total_length_mm / 1000.0
 track_resistance = layout_resistance_ohms(total_length_mm)
 estimated_power = estimate_layout_power(
@@ -419,17 +498,17 @@ if total_length_m > 30:
     )
 
 if inventory:
-    rows = []
-    for code, count in sorted(inventory.items()):
-        piece = library.get(code)
-        rows.append(
-            {
-                "Catalogue": code,
-                "Piece": piece.name if piece else "Unknown",
-                "Quantity": count,
-                "Length (mm)": f"{piece.arc_length():.0f}" if piece and piece.kind == "curve" else (f"{piece.length:.0f}" if piece else "-"),
-            }
-        )
-    st.dataframe(rows, hide_index=True, use_container_width=True)
+    labels = _inventory_labels()
+    unknown = ("Unknown", "-")
+    codes = sorted(inventory)
+    row_labels = [labels.get(code, unknown) for code in codes]
+    # Columnar data converts to a DataFrame without per-row dict handling.
+    table = {
+        "Catalogue": codes,
+        "Piece": [name for name, _ in row_labels],
+        "Quantity": [inventory[code] for code in codes],
+        "Length (mm)": [length_text for _, length_text in row_labels],
+    }
+    st.dataframe(table, hide_index=True, use_container_width=True)
 else:
     st.info("Add pieces from the library to begin building your layout.")
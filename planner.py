@@ -142,6 +142,41 @@ def total_run_length_mm(placements: Sequence[Dict[str, object]]) -> float:
     return total
 
 
+def inventory_run_length_mm(inventory: Dict[str, int]) -> float:
+    """Return the running length of an inventory of catalogue codes and counts."""
+
+    total = 0.0
+    for code, count in inventory.items():
+        piece = TRACK_LIBRARY.get(code)
+        if not piece:
+            continue
+        total += piece_display_length(piece) * count
+    return total
+
+
+def parse_polygon_text(text: str) -> Tuple[List[Tuple[float, float]], int]:
+    """Parse ``x,y`` lines into polygon points.
+
+    Returns the parsed points alongside the number of non-blank lines that
+    could not be interpreted as a coordinate pair.
+    """
+
+    points: List[Tuple[float, float]] = []
+    invalid_lines = 0
+    for line in text.splitlines():
+        parts = line.split(",")
+        if len(parts) != 2:
+            if line.strip():
+                invalid_lines += 1
+            continue
+        try:
+            # float() ignores surrounding whitespace, so no explicit strip is needed.
+            points.append((float(parts[0]), float(parts[1])))
+        except ValueError:
+            invalid_lines += 1
+    return points, invalid_lines
+
+
 def describe_board(board: BoardSpecification) -> str:
     """Provide a human readable description of the board."""
 